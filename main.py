@@ -1,41 +1,86 @@
-import re
-from datetime import datetime
+from collections import defaultdict
+from datetime import date
 import json
 import os
+import string
+import sys
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_NAME_CHARS = frozenset(string.ascii_letters + string.digits + ' ')
+_JSON_ERRORS = (json.JSONDecodeError,) if ijson is None else (json.JSONDecodeError, ijson.JSONError)
+# Число операций в журнале, после которого он сворачивается в основной файл
+_WAL_LIMIT = 1000
+
+
+def _json_dumps(obj, indent=True):
+    """Сериализует объект в JSON (с отступом 2 или в одну строку), возвращает байты"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    return json.dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+
+def _json_loads(data):
+    """Разбирает JSON из байтов"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 class PhoneBookEntry:
+    __slots__ = ('name', 'surname', 'phone', 'birthdate',
+                 '_name_lower', '_surname_lower', '_birthdate_obj', '_cached_dict')
 
     def __init__(self, name, surname, phone, birthdate=None):
         self.name = self.capitalize_first(name)
         self.surname = self.capitalize_first(surname)
+        self._name_lower = sys.intern(self.name.lower())
+        self._surname_lower = sys.intern(self.surname.lower())
         self.phone = self._format_phone(phone)
-        self.birthdate = self._validate_date(birthdate) if birthdate else None
+        self.birthdate, self._birthdate_obj = self._validate_date(birthdate) if birthdate else (None, None)
+        self._cached_dict = None
 
     @staticmethod
     def capitalize_first(text):
         """Делает первую букву заглавной"""
         if not text:
             raise ValueError("Имя/Фамилия не может быть пустым")
-        if not re.match("^[a-zA-Z0-9 ]+$", text):
+        if not _NAME_CHARS.issuperset(text):
             raise ValueError("Разрешены только латинские буквы, цифры и пробелы")
-        return text[0].upper() + text[1:].lower()
+        # Имена и фамилии часто повторяются, общие строки экономят память
+        return sys.intern(text[0].upper() + text[1:].lower())
 
     @staticmethod
     def _format_phone(phone):
         """Форматирует и проверяет номер телефона"""
-        phone = phone.strip().replace('+7', '8')
-        if not re.match("^[0-9]{11}$", phone):
+        phone = phone.strip()
+        if phone.startswith('+7'):
+            phone = '8' + phone[2:]
+        if len(phone) != 11 or not (phone.isascii() and phone.isdigit()):
             raise ValueError("Номер телефона должен содержать ровно 11 цифр")
         return phone
 
     @staticmethod
     def _validate_date(date_str):
-        """Проверяет формат даты"""
+        """Проверяет формат даты, возвращает строку и объект даты"""
+        # Разбирает фиксированный формат вручную, без интерпретатора форматов strptime
+        parts = date_str.split('.')
         try:
-            return datetime.strptime(date_str, "%d.%m.%Y").strftime("%d.%m.%Y")
+            if (len(parts) != 3 or not all(part.isascii() and part.isdigit() for part in parts)
+                    or len(parts[0]) > 2 or len(parts[1]) > 2 or len(parts[2]) != 4):
+                raise ValueError
+            parsed = date(int(parts[2]), int(parts[1]), int(parts[0]))
         except ValueError:
             raise ValueError("Неверный формат даты. Используйте ДД.ММ.ГГГГ")
+        return sys.intern(f"{parsed.day:02d}.{parsed.month:02d}.{parsed.year:04d}"), parsed
 
     def to_dict(self):
         """Конвертирует запись в словарь для хранения"""
@@ -46,116 +91,319 @@ class PhoneBookEntry:
             'birthdate': self.birthdate
         }
 
+    def _storage_dict(self):
+        """Возвращает общий кэшированный словарь для записи в файл; изменять его нельзя"""
+        if self._cached_dict is None:
+            self._cached_dict = self.to_dict()
+        return self._cached_dict
+
     @classmethod
     def from_dict(cls, data):
         """Создает запись из словаря"""
         return cls(data['name'], data['surname'], data['phone'], data['birthdate'])
 
+    @staticmethod
+    def _is_stored_name(text):
+        """Проверяет, что имя/фамилия уже в том виде, который возвращает capitalize_first"""
+        return bool(text) and _NAME_CHARS.issuperset(text) and text == text[0].upper() + text[1:].lower()
+
+    @staticmethod
+    def _is_stored_date(date_str):
+        """Проверяет, что дата уже в нормализованном виде ДД.ММ.ГГГГ"""
+        digits = date_str[:2] + date_str[3:5] + date_str[6:]
+        return (len(date_str) == 10 and date_str[2] == '.' and date_str[5] == '.'
+                and digits.isascii() and digits.isdigit())
+
+    @classmethod
+    def _from_trusted(cls, data):
+        """Создает запись из словаря, сохраненного самой программой, без повторных проверок"""
+        name, surname, phone = data['name'], data['surname'], data['phone']
+        birthdate = data.get('birthdate')
+        # Дешевая проверка нормализованного вида: вручную исправленный файл
+        # уходит на полную проверку в from_dict
+        if not (cls._is_stored_name(name) and cls._is_stored_name(surname)
+                and len(phone) == 11 and phone.isascii() and phone.isdigit()
+                and (not birthdate or cls._is_stored_date(birthdate))):
+            raise ValueError("Запись не в нормализованном виде")
+        entry = cls.__new__(cls)
+        entry.name = sys.intern(name)
+        entry.surname = sys.intern(surname)
+        entry._name_lower = sys.intern(name.lower())
+        entry._surname_lower = sys.intern(surname.lower())
+        entry.phone = phone
+        entry.birthdate = sys.intern(birthdate) if birthdate else None
+        entry._birthdate_obj = date(int(birthdate[6:]), int(birthdate[3:5]), int(birthdate[:2])) if birthdate else None
+        entry._cached_dict = None
+        return entry
+
+    @classmethod
+    def _from_stored(cls, data):
+        """Создает запись из сохраненного словаря, проверяя его, если файл правили вручную"""
+        try:
+            return cls._from_trusted(data)
+        except (ValueError, KeyError, TypeError, IndexError):
+            return cls.from_dict(data)
+
 
 class PhoneBook:
 
-    def __init__(self, filename='phonebook.json'):
+    def __init__(self, filename='phonebook.json', autosave=True):
         self.filename = filename
-        self.entries = []
+        self.wal_filename = os.path.splitext(filename)[0] + '.wal'
+        self.autosave = autosave
+        self._dirty = False
+        self._wal_records = 0
+        # Записи в порядке добавления, ключ - имя и фамилия в нижнем регистре
+        self.entries = {}
+        self._by_phone = defaultdict(list)
+        self._by_birthdate = defaultdict(list)
         self.load_from_file()
 
     def load_from_file(self):
-        """Загружает записи из файла"""
+        """Загружает записи из файла и применяет к ним журнал изменений"""
+        self._wal_records = 0
+        rewrite = False
         try:
             if os.path.exists(self.filename):
-                with open(self.filename, 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-                    self.entries = [PhoneBookEntry.from_dict(entry) for entry in data]
+                with open(self.filename, 'rb') as file:
+                    # ijson разбирает массив потоково, не держа в памяти все словари сразу
+                    data = ijson.items(file, 'item') if ijson is not None else _json_loads(file.read())
+                    entries = {}
+                    for record in data:
+                        entry = PhoneBookEntry._from_stored(record)
+                        key = (entry._name_lower, entry._surname_lower)
+                        if key in entries:
+                            # Имя и фамилия уникальны, повтор не попадет в файл при следующем сохранении
+                            print(f"Предупреждение: Повторная запись {entry.name} {entry.surname} "
+                                  f"({entry.phone}) пропущена")
+                            continue
+                        entries[key] = entry
+                    self.entries = entries
             else:
-                # Создает пустой файл, если он не существует
-                with open(self.filename, 'w', encoding='utf-8') as file:
-                    json.dump([], file)
-                self.entries = []
-        except json.JSONDecodeError:
+                # Создает файл, если он не существует
+                self.entries = {}
+                rewrite = True
+        except _JSON_ERRORS:
             print("Предупреждение: Поврежденный формат файла")
-            self.entries = []
-            # Создает новый пустой файл
-            with open(self.filename, 'w', encoding='utf-8') as file:
-                json.dump([], file)
+            self.entries = {}
+            rewrite = True
+        self._replay_wal()
+        if rewrite:
+            # Файл перезаписывается после применения журнала, иначе
+            # save_to_file удалил бы еще не свернутые изменения
+            self.save_to_file()
+        self._by_phone = defaultdict(list)
+        self._by_birthdate = defaultdict(list)
+        for entry in self.entries.values():
+            self._index_add(entry)
 
     def save_to_file(self):
         """Сохраняет записи в файл"""
-        with open(self.filename, 'w', encoding='utf-8') as file:
-            json.dump([entry.to_dict() for entry in self.entries], file, indent=2)
+        # Пишет во временный файл и подменяет им основной, чтобы сбой
+        # во время записи не оставил поврежденный JSON
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as file:
+            file.write(_json_dumps([entry._storage_dict() for entry in self.entries.values()]))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, self.filename)
+        # Журнал уже учтен в основном файле
+        if os.path.exists(self.wal_filename):
+            os.remove(self.wal_filename)
+        self._wal_records = 0
+        self._dirty = False
+
+    def flush(self):
+        """Записывает в файл отложенные изменения и сворачивает журнал"""
+        if self._dirty or self._wal_records:
+            self.save_to_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def _record(self, op):
+        """Дописывает операцию в журнал или откладывает сохранение до flush()"""
+        if not self.autosave:
+            self._dirty = True
+            return
+        with open(self.wal_filename, 'ab') as file:
+            file.write(_json_dumps(op, indent=False) + b'\n')
+        self._wal_records += 1
+        if self._wal_records >= _WAL_LIMIT:
+            self.save_to_file()
+
+    def _replay_wal(self):
+        """Применяет к загруженным записям операции из журнала"""
+        if not os.path.exists(self.wal_filename):
+            return
+        with open(self.wal_filename, 'rb+') as file:
+            lines = file.readlines()
+            offset = 0
+            for number, line in enumerate(lines, 1):
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("Оборванная строка журнала")
+                    self._apply_wal_op(_json_loads(line))
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    if number == len(lines):
+                        # Последняя строка оборвалась при сбое: отрезаем ее,
+                        # чтобы следующая операция не дописалась к обрывку
+                        file.truncate(offset)
+                        break
+                    # Строка в середине журнала не может оборваться при сбое записи,
+                    # поэтому о ней нужно сообщить; она исчезнет при сворачивании
+                    print(f"Предупреждение: Поврежденная строка {number} журнала пропущена")
+                offset += len(line)
+                self._wal_records += 1
+
+    def _apply_wal_op(self, op):
+        """Применяет одну операцию журнала к записям"""
+        key = tuple(op.get('key', ()))
+        if op['op'] == 'del':
+            self.entries.pop(key, None)
+        else:
+            entry = PhoneBookEntry._from_stored(op['data'])
+            new_key = (entry._name_lower, entry._surname_lower)
+            if op['op'] == 'upd' and key in self.entries and new_key != key:
+                self.entries = {(new_key if k == key else k): e for k, e in self.entries.items()}
+            self.entries[new_key] = entry
+
+    def _index_add(self, entry):
+        """Добавляет запись в индексы по телефону и дате рождения"""
+        self._by_phone[entry.phone].append(entry)
+        if entry.birthdate:
+            self._by_birthdate[entry.birthdate].append(entry)
+
+    def _index_remove(self, entry):
+        """Удаляет запись из индексов"""
+        self._by_phone[entry.phone].remove(entry)
+        if not self._by_phone[entry.phone]:
+            del self._by_phone[entry.phone]
+        if entry.birthdate:
+            self._by_birthdate[entry.birthdate].remove(entry)
+            if not self._by_birthdate[entry.birthdate]:
+                del self._by_birthdate[entry.birthdate]
 
     def add_entry(self, name, surname, phone, birthdate=None):
         """Добавляет новую запись в телефонную книгу"""
         if self.find_entry(name, surname):
             raise ValueError("Запись с таким именем и фамилией уже существует")
         entry = PhoneBookEntry(name, surname, phone, birthdate)
-        self.entries.append(entry)
-        self.save_to_file()
+        self.entries[(entry._name_lower, entry._surname_lower)] = entry
+        self._index_add(entry)
+        self._record({'op': 'add', 'data': entry._storage_dict()})
 
     def find_entry(self, name=None, surname=None, phone=None, birthdate=None):
         """Ищет записи, соответствующие заданным критериям"""
-        results = self.entries[:]
-        if name:
-            results = [e for e in results if e.name.lower() == name.lower()]
-        if surname:
-            results = [e for e in results if e.surname.lower() == surname.lower()]
+        if name and surname:
+            # Имя и фамилия однозначно определяют запись
+            entry = self.entries.get((name.lower(), surname.lower()))
+            if entry is None or (phone and entry.phone != phone) or (birthdate and entry.birthdate != birthdate):
+                return []
+            return [entry]
+        # Кандидаты берутся из индекса без копирования, телефон по нему уже совпадает
         if phone:
-            results = [e for e in results if e.phone == phone]
-        if birthdate:
-            results = [e for e in results if e.birthdate == birthdate]
-        return results
+            results = self._by_phone.get(phone, ())
+        elif birthdate:
+            results = self._by_birthdate.get(birthdate, ())
+        else:
+            results = self.entries.values()
+        # Все оставшиеся условия проверяются за один проход
+        name_lower = name.lower() if name else None
+        surname_lower = surname.lower() if surname else None
+        return [e for e in results
+                if (name_lower is None or e._name_lower == name_lower)
+                and (surname_lower is None or e._surname_lower == surname_lower)
+                and (not birthdate or e.birthdate == birthdate)]
 
     def delete_entry(self, name, surname):
         """Удаляет запись по имени и фамилии"""
-        entries = self.find_entry(name, surname)
-        if not entries:
+        entry = self.entries.pop((name.lower(), surname.lower()), None)
+        if entry is None:
             raise ValueError("Запись не найдена")
-        self.entries.remove(entries[0])
-        self.save_to_file()
+        self._index_remove(entry)
+        self._record({'op': 'del', 'key': [entry._name_lower, entry._surname_lower]})
 
     def update_entry(self, name, surname, new_data):
         """Обновляет существующую запись"""
-        entries = self.find_entry(name, surname)
-        if not entries:
+        key = (name.lower(), surname.lower())
+        entry = self.entries.get(key)
+        if entry is None:
             raise ValueError("Запись не найдена")
-        entry = entries[0]
-
-        if 'name' in new_data:
-            entry.name = PhoneBookEntry.capitalize_first(new_data['name'])
-        if 'surname' in new_data:
-            entry.surname = PhoneBookEntry.capitalize_first(new_data['surname'])
-        if 'phone' in new_data:
-            entry.phone = PhoneBookEntry._format_phone(new_data['phone'])
+
+        # Проверяет все новые значения до изменения записи
+        new_name = PhoneBookEntry.capitalize_first(new_data['name']) if 'name' in new_data else entry.name
+        new_surname = PhoneBookEntry.capitalize_first(new_data['surname']) if 'surname' in new_data else entry.surname
+        new_phone = PhoneBookEntry._format_phone(new_data['phone']) if 'phone' in new_data else entry.phone
         if 'birthdate' in new_data:
-            entry.birthdate = PhoneBookEntry._validate_date(new_data['birthdate'])
+            new_birthdate, new_birthdate_obj = PhoneBookEntry._validate_date(new_data['birthdate'])
+        else:
+            new_birthdate, new_birthdate_obj = entry.birthdate, entry._birthdate_obj
+        new_key = (sys.intern(new_name.lower()), sys.intern(new_surname.lower()))
+        if new_key != key and new_key in self.entries:
+            raise ValueError("Запись с таким именем и фамилией уже существует")
+
+        self._index_remove(entry)
+        entry.name, entry._name_lower = new_name, new_key[0]
+        entry.surname, entry._surname_lower = new_surname, new_key[1]
+        entry.phone = new_phone
+        entry.birthdate, entry._birthdate_obj = new_birthdate, new_birthdate_obj
+        entry._cached_dict = None
+        self._index_add(entry)
+        if new_key != key:
+            # Перестраивает словарь под новый ключ, сохраняя порядок записей
+            self.entries = {(new_key if k == key else k): e for k, e in self.entries.items()}
 
-        self.save_to_file()
+        self._record({'op': 'upd', 'key': list(key), 'data': entry._storage_dict()})
 
     def get_age(self, name, surname):
         """Вычисляет возраст для заданной записи"""
         entries = self.find_entry(name, surname)
         if not entries or not entries[0].birthdate:
             raise ValueError("Запись не найдена или дата рождения не указана")
-        birthdate = datetime.strptime(entries[0].birthdate, "%d.%m.%Y")
-        today = datetime.now()
+        birthdate = entries[0]._birthdate_obj
+        today = date.today()
         age = today.year - birthdate.year
         if today.month < birthdate.month or (today.month == birthdate.month and today.day < birthdate.day):
             age -= 1
         return age
 
 
+MENU = (
+    "\nОперации с телефонной книгой:\n"
+    "1. Просмотреть все записи\n"
+    "2. Поиск записей\n"
+    "3. Добавить новую запись\n"
+    "4. Удалить запись\n"
+    "5. Обновить запись\n"
+    "6. Узнать возраст человека\n"
+    "7. Выход\n"
+)
+
+
+def format_entries(entries):
+    """Форматирует записи для вывода одной операцией записи"""
+    lines = []
+    for entry in entries:
+        lines.append(f"\nИмя: {entry.name}")
+        lines.append(f"Фамилия: {entry.surname}")
+        lines.append(f"Телефон: {entry.phone}")
+        if entry.birthdate:
+            lines.append(f"Дата рождения: {entry.birthdate}")
+        lines.append("-" * 30)
+    return "\n".join(lines) + "\n"
+
+
 def main():
     """Обработка консольного интерфейса"""
     phone_book = PhoneBook()
+    out = sys.stdout.write
 
     while True:
-        print("\nОперации с телефонной книгой:")
-        print("1. Просмотреть все записи")
-        print("2. Поиск записей")
-        print("3. Добавить новую запись")
-        print("4. Удалить запись")
-        print("5. Обновить запись")
-        print("6. Узнать возраст человека")
-        print("7. Выход")
+        out(MENU)
 
         try:
             choice = input("\nВведите ваш выбор (1-7): ").strip()
@@ -164,13 +412,7 @@ def main():
                 if not phone_book.entries:
                     print("Телефонная книга пуста")
                 else:
-                    for entry in phone_book.entries:
-                        print(f"\nИмя: {entry.name}")
-                        print(f"Фамилия: {entry.surname}")
-                        print(f"Телефон: {entry.phone}")
-                        if entry.birthdate:
-                            print(f"Дата рождения: {entry.birthdate}")
-                        print("-" * 30)
+                    out(format_entries(phone_book.entries.values()))
 
             elif choice == '2':
                 print("\nВведите критерии поиска (нажмите Enter, чтобы пропустить):")
@@ -183,13 +425,7 @@ def main():
                 if not results:
                     print("Записи не найдены")
                 else:
-                    for entry in results:
-                        print(f"\nИмя: {entry.name}")
-                        print(f"Фамилия: {entry.surname}")
-                        print(f"Телефон: {entry.phone}")
-                        if entry.birthdate:
-                            print(f"Дата рождения: {entry.birthdate}")
-                        print("-" * 30)
+                    out(format_entries(results))
 
             elif choice == '3':
                 print("\nВведите данные новой записи:")
@@ -250,6 +486,8 @@ def main():
                     print(f"Ошибка: {e}")
 
             elif choice == '7':
+                # Сворачивает журнал, чтобы phonebook.json содержал все изменения сессии
+                phone_book.flush()
                 print("Выход из программы")
                 break
 
@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import main
+from main import PhoneBook
+
+
+class PhoneBookJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'pb.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_append_after_torn_journal_line_survives_restart(self):
+        book = PhoneBook(self.filename)
+        book.add_entry('Ivan', 'Ivanov', '89308003344')
+        book.add_entry('Petr', 'Petrov', '88005553535')
+        with open(book.wal_filename, 'ab') as file:
+            file.write(b'{"op":"add","data":{"name":"Ann')
+
+        book = PhoneBook(self.filename)
+        self.assertEqual(len(book.entries), 2)
+        book.add_entry('Olga', 'Smirnova', '89001112233')
+
+        book = PhoneBook(self.filename)
+        self.assertEqual(len(book.entries), 3)
+        self.assertTrue(book.find_entry('olga', 'smirnova'))
+
+    def test_corrupt_snapshot_keeps_journal_changes(self):
+        book = PhoneBook(self.filename)
+        book.add_entry('Ivan', 'Ivanov', '89308003344')
+        book.add_entry('Petr', 'Petrov', '88005553535')
+        with open(self.filename, 'w', encoding='utf-8') as file:
+            file.write('[{"name": ')
+
+        book = PhoneBook(self.filename)
+        self.assertEqual(len(book.entries), 2)
+        self.assertEqual(len(PhoneBook(self.filename).entries), 2)
+
+    def test_hand_edited_snapshot_is_normalized_on_load(self):
+        with open(self.filename, 'w', encoding='utf-8') as file:
+            file.write('[{"name": "ivan", "surname": "IVANOV", "phone": "+79308003344", "birthdate": "1.2.1990"}]')
+
+        book = PhoneBook(self.filename)
+        entry = book.find_entry(phone='89308003344')[0]
+        self.assertEqual((entry.name, entry.surname, entry.birthdate), ('Ivan', 'Ivanov', '01.02.1990'))
+
+    def test_hand_edited_snapshot_with_bad_date_is_rejected(self):
+        for birthdate in ('01.02. 990', '01.02.1_90', '01.02.+990'):
+            with open(self.filename, 'w', encoding='utf-8') as file:
+                file.write('[{"name": "Ivan", "surname": "Ivanov", "phone": "89308003344", '
+                           '"birthdate": "%s"}]' % birthdate)
+            with self.assertRaises(ValueError):
+                PhoneBook(self.filename)
+
+    def test_to_dict_returns_independent_copy(self):
+        book = PhoneBook(self.filename)
+        book.add_entry('Ivan', 'Ivanov', '89308003344')
+        entry = book.find_entry('ivan', 'ivanov')[0]
+        entry.to_dict()['phone'] = '0'
+        book.save_to_file()
+
+        self.assertEqual(entry.to_dict()['phone'], '89308003344')
+        self.assertEqual(PhoneBook(self.filename).find_entry('ivan', 'ivanov')[0].phone, '89308003344')
+
+    def test_cli_exit_compacts_journal(self):
+        commands = ['3', 'Ivan', 'Ivanov', '89308003344', '',
+                    '3', 'Petr', 'Petrov', '88005553535', '',
+                    '5', 'Petr', 'Petrov', '', 'Sidorov', '', '',
+                    '4', 'Ivan', 'Ivanov',
+                    '7']
+        cwd = os.getcwd()
+        os.chdir(self.dir)
+        try:
+            with mock.patch('builtins.input', side_effect=commands), mock.patch('sys.stdout'):
+                main.main()
+        finally:
+            os.chdir(cwd)
+
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'phonebook.wal')))
+        with open(os.path.join(self.dir, 'phonebook.json'), encoding='utf-8') as file:
+            self.assertEqual([(e['name'], e['surname']) for e in json.load(file)], [('Petr', 'Sidorov')])
+
+    def test_bad_middle_journal_line_keeps_later_operations(self):
+        book = PhoneBook(self.filename)
+        book.add_entry('Ivan', 'Ivanov', '89308003344')
+        with open(book.wal_filename, 'ab') as file:
+            file.write(b'{"op":"add","data":{"name":"Ann\n')
+        book.add_entry('Petr', 'Petrov', '88005553535')
+
+        with mock.patch('builtins.print') as print_mock:
+            book = PhoneBook(self.filename)
+        print_mock.assert_called_once()
+        self.assertEqual(len(book.entries), 2)
+        book.flush()
+        self.assertEqual(len(PhoneBook(self.filename).entries), 2)
+
+    def test_rename_is_replayed_in_place(self):
+        book = PhoneBook(self.filename)
+        book.add_entry('Ivan', 'Ivanov', '89308003344')
+        book.add_entry('Petr', 'Petrov', '88005553535')
+        book.add_entry('Anna', 'Smirnova', '89001112233')
+        book.update_entry('petr', 'petrov', {'surname': 'Sidorov', 'phone': '89990001122'})
+        expected = [('Ivan', 'Ivanov'), ('Petr', 'Sidorov'), ('Anna', 'Smirnova')]
+
+        book = PhoneBook(self.filename)
+        self.assertEqual([(e.name, e.surname) for e in book.entries.values()], expected)
+        self.assertEqual(book.find_entry(phone='89990001122')[0].surname, 'Sidorov')
+
+        # Сбой после записи снимка, но до удаления журнала: журнал применяется повторно
+        with open(book.wal_filename, 'rb') as file:
+            journal = file.read()
+        book.flush()
+        with open(book.wal_filename, 'wb') as file:
+            file.write(journal)
+        book = PhoneBook(self.filename)
+        self.assertEqual([(e.name, e.surname) for e in book.entries.values()], expected)
+        self.assertEqual(book.find_entry('petr', 'petrov'), [])
+
+    def test_duplicate_snapshot_record_is_reported(self):
+        with open(self.filename, 'w', encoding='utf-8') as file:
+            file.write('[{"name": "Ivan", "surname": "Ivanov", "phone": "89308003344", "birthdate": null},'
+                       ' {"name": "Ivan", "surname": "Ivanov", "phone": "88005553535", "birthdate": null}]')
+
+        with mock.patch('builtins.print') as print_mock:
+            book = PhoneBook(self.filename)
+        self.assertIn('88005553535', print_mock.call_args[0][0])
+        self.assertEqual(book.find_entry('ivan', 'ivanov')[0].phone, '89308003344')
+
+
+if __name__ == '__main__':
+    unittest.main()